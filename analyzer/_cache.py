@@ -0,0 +1,25 @@
+# analyzer/_cache.py
+# Size cap for the on-disk caches in .cache (features .npz, chart .png).
+# Entries are never invalidated in place (new data / version bump = new
+# key), so each write prunes the oldest files of its kind.
+
+from __future__ import annotations
+import glob
+import os
+
+
+def prune_cache(cache_dir: str, pattern: str, keep: int) -> None:
+    """Deletes all but the `keep` most recently written files matching `pattern` in `cache_dir`."""
+    entries = []
+    for path in glob.glob(os.path.join(cache_dir, pattern)):
+        try:
+            entries.append((os.path.getmtime(path), path))
+        except OSError:
+            pass  # removed by another process meanwhile
+
+    entries.sort(reverse=True)
+    for _, path in entries[keep:]:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
@@ -0,0 +1,185 @@
+# analyzer/_nb.py
+# Numba kernels for the hot loops in features.py (EMA / Wilder smoothing,
+# True Range), patterns.py (fused candle-pattern scan) and report.py
+# (candle chart geometry). Falls back to plain Python when numba is not
+# installed, so the package keeps working without it.
+
+from __future__ import annotations
+import numpy as np
+
+try:
+    from numba import njit, prange
+    HAVE_NUMBA = True
+except ImportError:  # pragma: no cover - numba is optional
+    HAVE_NUMBA = False
+    prange = range
+
+    def njit(*args, **kwargs):
+        # Support both @njit and @njit(...)
+        if len(args) == 1 and callable(args[0]) and not kwargs:
+            return args[0]
+        return lambda fn: fn
+
+
+@njit(cache=True)
+def ewm_nb(x: np.ndarray, alpha: float, minp: int) -> np.ndarray:
+    # Same recursion as pandas ewm(alpha=..., adjust=False, min_periods=minp).mean()
+    N = x.shape[0]
+    out = np.empty(N, dtype=np.float64)
+    if N == 0:
+        return out
+
+    old_wt_factor = 1.0 - alpha
+    weighted = x[0]
+    nobs = 1 if weighted == weighted else 0
+    out[0] = weighted if nobs >= minp else np.nan
+    old_wt = 1.0
+
+    for i in range(1, N):
+        cur = x[i]
+        is_obs = cur == cur
+        if is_obs:
+            nobs += 1
+        if weighted == weighted:
+            old_wt *= old_wt_factor
+            if is_obs:
+                if weighted != cur:
+                    weighted = (old_wt * weighted + alpha * cur) / (old_wt + alpha)
+                old_wt = 1.0
+        elif is_obs:
+            weighted = cur
+        out[i] = weighted if nobs >= minp else np.nan
+    return out
+
+
+@njit(cache=True)
+def wilder_ema_nb(x: np.ndarray, n: int) -> np.ndarray:
+    # Wilder smoothing == EMA with alpha = 1/n, NaN until n observations
+    return ewm_nb(x, 1.0 / n, n)
+
+
+@njit(cache=True)
+def ema_nb(x: np.ndarray, span: int) -> np.ndarray:
+    return ewm_nb(x, 2.0 / (span + 1.0), 1)
+
+
+@njit(cache=True)
+def true_range_nb(high: np.ndarray, low: np.ndarray, close: np.ndarray) -> np.ndarray:
+    # max(h - l, |h - prev_close|, |l - prev_close|), skipping NaN terms
+    N = close.shape[0]
+    out = np.empty(N, dtype=np.float64)
+    for i in range(N):
+        best = high[i] - low[i]
+        if i > 0:
+            pc = close[i - 1]
+            for cand in (abs(high[i] - pc), abs(low[i] - pc)):
+                if cand == cand and (best != best or cand > best):
+                    best = cand
+        out[i] = best
+    return out
+
+
+@njit(cache=True)
+def _nanmax2(a: float, b: float) -> float:
+    # max() skipping NaN, like DataFrame.max(axis=1)
+    if a != a:
+        return b
+    if b != b:
+        return a
+    return a if a > b else b
+
+
+@njit(cache=True)
+def _nanmin2(a: float, b: float) -> float:
+    if a != a:
+        return b
+    if b != b:
+        return a
+    return a if a < b else b
+
+
+@njit(parallel=True, cache=True)
+def detect_all_nb(o, h, l, c, out, doji_threshold=0.1):
+    # One pass over OHLC filling out[N, 9] with the PatternDetector rules,
+    # columns in patterns.PATTERNS order. NaN comparisons are False, which
+    # matches the shifted-Series versions of the detectors.
+    # Row i only reads rows i-2..i and only writes out[i, :], so rows are
+    # split across threads with prange.
+    N = o.shape[0]
+    for i in prange(N):
+        body = abs(c[i] - o[i])
+        bullish = c[i] > o[i]
+        bearish = c[i] < o[i]
+        upper_wick = h[i] - _nanmax2(o[i], c[i])
+        lower_wick = _nanmin2(o[i], c[i]) - l[i]
+        full_range = h[i] - l[i]
+        if full_range == 0:
+            full_range = 1.0
+
+        # hammer / shooting_star / doji
+        out[i, 2] = lower_wick >= 2 * body and upper_wick <= body and body > 0
+        out[i, 3] = upper_wick >= 2 * body and lower_wick <= body and body > 0
+        out[i, 4] = body / full_range <= doji_threshold
+
+        if i < 1:
+            out[i, 0] = out[i, 1] = out[i, 5] = out[i, 6] = False
+            out[i, 7] = out[i, 8] = False
+            continue
+
+        # bullish_engulfing / bearish_engulfing
+        prev_bullish = c[i - 1] > o[i - 1]
+        prev_bearish = c[i - 1] < o[i - 1]
+        out[i, 0] = prev_bearish and bullish and o[i] < c[i - 1] and c[i] > o[i - 1]
+        out[i, 1] = prev_bullish and bearish and o[i] > c[i - 1] and c[i] < o[i - 1]
+
+        # inside_bar / outside_bar
+        out[i, 5] = h[i] <= h[i - 1] and l[i] >= l[i - 1]
+        out[i, 6] = h[i] >= h[i - 1] and l[i] <= l[i - 1]
+
+        if i < 2:
+            out[i, 7] = out[i, 8] = False
+            continue
+
+        # morning_star / evening_star
+        body_prev1 = abs(c[i - 1] - o[i - 1])
+        body_prev2 = abs(c[i - 2] - o[i - 2])
+        small_mid = body_prev1 <= body_prev2 * 0.5
+        mid1 = (o[i - 2] + c[i - 2]) / 2
+        out[i, 7] = (c[i - 2] < o[i - 2]) and small_mid and bullish and c[i] > mid1
+        out[i, 8] = (c[i - 2] > o[i - 2]) and small_mid and bearish and c[i] < mid1
+    return out
+
+
+@njit(cache=True)
+def _candle_geom_jit(o, h, l, c):
+    n = o.shape[0]
+    segs = np.empty((n, 2, 2), o.dtype)
+    bot = np.empty(n, o.dtype)
+    hgt = np.empty(n, o.dtype)
+    up = np.empty(n, np.bool_)
+    for i in range(n):
+        segs[i, 0, 0] = i
+        segs[i, 0, 1] = l[i]
+        segs[i, 1, 0] = i
+        segs[i, 1, 1] = h[i]
+        bot[i] = o[i] if o[i] < c[i] else c[i]
+        hgt[i] = c[i] - o[i] if c[i] > o[i] else o[i] - c[i]
+        up[i] = c[i] > o[i]
+    return segs, bot, hgt, up
+
+
+def _candle_geom_np(o, h, l, c):
+    idx = np.arange(o.shape[0], dtype=o.dtype)
+    segs = np.stack([np.column_stack([idx, l]), np.column_stack([idx, h])], axis=1)
+    return segs, np.where(o < c, o, c), np.abs(c - o), c > o
+
+
+def candle_geom(o, h, l, c):
+    """
+    Chart geometry for n candles in one pass:
+    wick segments (n, 2, 2), body bottom, body height, and up (c > o) flags.
+    Float outputs keep the input dtype (float32 for the chart).
+    """
+    if HAVE_NUMBA:
+        return _candle_geom_jit(o, h, l, c)
+    return _candle_geom_np(o, h, l, c)
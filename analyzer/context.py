@@ -0,0 +1,28 @@
+import numpy as np
+import pandas as pd
+
+class AnalyzerContext:
+    """
+    Lazy cache of float64 OHLCV arrays for one DataFrame, shared by the
+    analyzers (features, patterns) so each column is cast at most once.
+
+    f64(name) : contiguous float64 copy of a column, cast on first use
+                (zeros when the column is missing)
+    """
+
+    def __init__(self, df: pd.DataFrame):
+        self.df = df
+        self._f64 = {}
+
+    def __len__(self):
+        return len(self.df)
+
+    def f64(self, name: str) -> np.ndarray:
+        """float64 version of a column, cached."""
+        if name not in self._f64:
+            if name in self.df.columns:
+                arr = self.df[name].to_numpy(dtype=np.float64)
+            else:
+                arr = np.zeros(len(self.df), dtype=np.float64)
+            self._f64[name] = np.ascontiguousarray(arr)
+        return self._f64[name]
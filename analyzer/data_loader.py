@@ -1,36 +1,87 @@
+from types import MappingProxyType
+
+import numpy as np
 import pandas as pd
 
+from .context import AnalyzerContext
+
+# Known column name variations -> project column names
+_RENAME = MappingProxyType({
+    # Common variations for date
+    "date": "date",
+    "time": "date",
+    "datetime": "date",
+    "timestamp": "date",
+    "open time": "date",
+
+    # Prices
+    "open": "open",
+    "o": "open",
+    "high": "high",
+    "h": "high",
+    "low": "low",
+    "l": "low",
+    "close": "close",
+    "c": "close",
+    "adj close": "close",
+
+    # Volume
+    "volume": "volume",
+    "v": "volume",
+    "vol": "volume",
+    "tickvol": "volume",
+})
+
+# Columns the analyzers use
+_COLUMNS = frozenset(["date", "open", "high", "low", "close", "volume"])
+
+
 class DataLoader:
     def __init__(self, filepath: str):
         self.filepath = filepath
 
     def load_csv(self):
-        # Load the CSV file
-        df = pd.read_csv(self.filepath)
-
-        # Auto-detect and rename any known column formats
-        df = self._auto_rename_columns(df)
+        # Peek at the header only, to resolve the column names
+        header = pd.read_csv(self.filepath, nrows=0).columns
 
-        # Normalize all column names (lowercase, no spaces)
-        df.columns = [c.lower().strip() for c in df.columns]
+        # Normalize column names (lowercase, no spaces) and
+        # auto-detect/rename any known column formats (first match wins)
+        source = {}
+        for col in header:
+            key = col.lower().strip()
+            name = _RENAME.get(key, key)
+            if name in _COLUMNS and name not in source:
+                source[name] = col
 
         # Required columns for the project
         required = ["date", "open", "high", "low", "close"]
         for col in required:
-            if col not in df.columns:
+            if col not in source:
                 raise ValueError(f"Missing required column: {col}")
 
-        # Convert date column
-        df["date"] = pd.to_datetime(df["date"], errors="coerce")
-
-        # Convert price columns to numeric
-        for col in ["open", "high", "low", "close"]:
-            df[col] = pd.to_numeric(df[col], errors="coerce")
+        # Load only the columns we use, parsed in a single pass
+        numeric = [c for c in ["open", "high", "low", "close", "volume"] if c in source]
+        try:
+            df = pd.read_csv(
+                self.filepath,
+                usecols=list(source.values()),
+                dtype={source[c]: "float64" for c in numeric},
+                parse_dates=[source["date"]],
+            )
+        except ValueError:
+            # Non-numeric values somewhere: load as-is and coerce them to NaN
+            df = pd.read_csv(self.filepath, usecols=list(source.values()))
+            for col in numeric:
+                df[source[col]] = pd.to_numeric(df[source[col]], errors="coerce").astype("float64")
+
+        df = df.rename(columns={col: name for name, col in source.items()})
+
+        # Unparseable dates become NaT
+        if not pd.api.types.is_datetime64_any_dtype(df["date"]):
+            df["date"] = pd.to_datetime(df["date"], errors="coerce")
 
         # Handle volume column (optional)
-        if "volume" in df.columns:
-            df["volume"] = pd.to_numeric(df["volume"], errors="coerce")
-        else:
+        if "volume" not in df.columns:
             df["volume"] = 0.0
 
         # Sort chronologically
@@ -39,47 +90,11 @@ class DataLoader:
         # Detect timeframe
         self.timeframe = self.detect_timeframe(df)
 
-        return df
-
+        # float64 OHLCV arrays, cast on first use and shared by the analyzers
+        self.context = AnalyzerContext(df)
 
         return df
 
-    def _auto_rename_columns(self, df):
-        rename_map = {
-            # Common variations for date
-            "date": "date",
-            "time": "date",
-            "datetime": "date",
-            "timestamp": "date",
-            "open time": "date",
-
-            # Prices
-            "open": "open",
-            "o": "open",
-            "high": "high",
-            "h": "high",
-            "low": "low",
-            "l": "low",
-            "close": "close",
-            "c": "close",
-            "adj close": "close",
-
-            # Volume
-            "volume": "volume",
-            "v": "volume",
-            "vol": "volume",
-            "tickvol": "volume",
-        }
-
-        new_cols = {}
-        for col in df.columns:
-            key = col.lower().strip()
-            new_cols[col] = rename_map.get(key, key)
-
-        df = df.rename(columns=new_cols)
-        return df
-   
-   
     def detect_timeframe(self, df):
         """
         Detects the timeframe by calculating the median difference between timestamps.
@@ -90,14 +105,14 @@ class DataLoader:
         if len(df) < 2:
             return "unknown"
 
-        # Time difference between each row
-        diffs = df["date"].diff().dropna()
-
-        # Median difference (most consistent)
-        delta = diffs.median()
+        # Timestamps as int64 nanoseconds (NaT dropped)
+        dates = df["date"].to_numpy(dtype="datetime64[ns]")
+        dates = dates[~np.isnat(dates)]
+        if len(dates) < 2:
+            return "unknown"
 
-        # Convert to seconds
-        seconds = delta.total_seconds()
+        # Median difference between each row (most consistent), in seconds
+        seconds = np.median(np.diff(dates.view("i8"))) / 1e9
 
         # Match thresholds
         if seconds < 60 * 2:
@@ -3,29 +3,65 @@
 # Scalable to decades of data (all vectorized; no Python loops)
 
 from __future__ import annotations
+import hashlib
+import os
+import time
+import zipfile
+
 import numpy as np
 import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+from .context import AnalyzerContext
+from ._cache import prune_cache
+from ._nb import ema_nb, true_range_nb, wilder_ema_nb
+
+try:
+    import talib  # optional C backend for the Wilder-smoothed indicators
+except ImportError:
+    talib = None
 
 
 # ---------- basic helpers ----------
 
+def _sma_family(s: pd.Series, windows) -> dict:
+    # rolling(n, min_periods=1).mean() for several n from one cumulative sum
+    arr = s.to_numpy(dtype=np.float64)
+    valid = ~np.isnan(arr)
+    cs = np.concatenate(([0.0], np.cumsum(np.where(valid, arr, 0.0))))
+    cnt = np.concatenate(([0], np.cumsum(valid)))
+    start = np.arange(len(arr)) + 1
+
+    out = {}
+    for n in windows:
+        lo = np.maximum(start - n, 0)
+        num = cnt[start] - cnt[lo]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean = (cs[start] - cs[lo]) / num
+        out[n] = pd.Series(np.where(num > 0, mean, np.nan), index=s.index)
+    return out
+
 def _sma(s: pd.Series, n: int) -> pd.Series:
-    return s.rolling(n, min_periods=1).mean()
+    return _sma_family(s, [n])[n]
 
 def _ema(s: pd.Series, n: int) -> pd.Series:
-    return s.ewm(span=n, adjust=False, min_periods=1).mean()
+    return pd.Series(ema_nb(s.to_numpy(dtype=np.float64), n), index=s.index)
 
 def _true_range(high: pd.Series, low: pd.Series, close: pd.Series) -> pd.Series:
-    prev_close = close.shift(1)
-    tr1 = high - low
-    tr2 = (high - prev_close).abs()
-    tr3 = (low - prev_close).abs()
-    tr = pd.concat([tr1, tr2, tr3], axis=1).max(axis=1)
-    return tr
+    tr = true_range_nb(
+        high.to_numpy(dtype=np.float64),
+        low.to_numpy(dtype=np.float64),
+        close.to_numpy(dtype=np.float64),
+    )
+    return pd.Series(tr, index=close.index)
+
+def _np(s: pd.Series) -> np.ndarray:
+    # Contiguous float64 buffer, as required by TA-Lib
+    return np.ascontiguousarray(s.to_numpy(dtype=np.float64))
 
 def _wilder_ema(s: pd.Series, n: int) -> pd.Series:
     # Wilder smoothing == EMA with alpha = 1/n
-    return s.ewm(alpha=1.0/n, adjust=False, min_periods=n).mean()
+    return pd.Series(wilder_ema_nb(s.to_numpy(dtype=np.float64), n), index=s.index)
 
 def _safe_div(num: pd.Series, den: pd.Series) -> pd.Series:
     out = num / den.replace(0, np.nan)
@@ -33,18 +69,37 @@ def _safe_div(num: pd.Series, den: pd.Series) -> pd.Series:
 
 def _rolling_percentile_current_value(s: pd.Series, n: int) -> pd.Series:
     # Percentile of current value within the last n observations
-    # Uses rolling window + proportion <= last value
-    def pct(w: np.ndarray) -> float:
-        if len(w) == 0:
-            return np.nan
-        last = w[-1]
-        return float((w <= last).mean())
-    return s.rolling(n, min_periods=1).apply(pct, raw=True)
+    # Proportion of the window <= last value, computed on strided windows
+    arr = s.to_numpy(dtype=float)
+    N = len(arr)
+    out = np.empty(N, dtype=float)
+
+    # Head: partial windows arr[:i+1] (same as rolling with min_periods=1)
+    k = min(n - 1, N)
+    head = arr[:k]
+    tril = np.tri(k, dtype=bool)
+    out[:k] = ((head[None, :] <= head[:, None]) & tril).sum(axis=1) / np.arange(1, k + 1)
+
+    # Full windows
+    if N >= n:
+        W = sliding_window_view(arr, n)
+        out[n - 1:] = (W <= W[:, -1:]).mean(axis=1)
+
+    # Windows without any valid observation stay NaN
+    valid = np.concatenate(([0], np.cumsum(~np.isnan(arr))))
+    start = np.maximum(np.arange(N) + 1 - n, 0)
+    out[valid[1:] - valid[start] == 0] = np.nan
+
+    return pd.Series(out, index=s.index)
 
 
 # ---------- indicators ----------
 
 def _rsi(close: pd.Series, n: int = 14) -> pd.Series:
+    if talib is not None:
+        rsi = pd.Series(talib.RSI(_np(close), n), index=close.index)
+        return rsi.fillna(50.0)
+
     delta = close.diff()
     gain = delta.clip(lower=0.0)
     loss = -delta.clip(upper=0.0)
@@ -54,19 +109,31 @@ def _rsi(close: pd.Series, n: int = 14) -> pd.Series:
     rsi = 100 - (100 / (1 + rs))
     return rsi.fillna(50.0)
 
-def _atr(high: pd.Series, low: pd.Series, close: pd.Series, n: int = 14) -> pd.Series:
-    tr = _true_range(high, low, close)
-    atr = _wilder_ema(tr, n)
+def _atr(high: pd.Series, low: pd.Series, close: pd.Series, n: int = 14, tr: pd.Series | None = None) -> pd.Series:
+    if tr is None:
+        tr = _true_range(high, low, close)
+    if talib is not None:
+        atr = pd.Series(talib.ATR(_np(high), _np(low), _np(close), n), index=close.index)
+    else:
+        atr = _wilder_ema(tr, n)
     return tr, atr  # return TR too for other uses
 
-def _adx_di(high: pd.Series, low: pd.Series, close: pd.Series, n: int = 14):
+def _adx_di(high: pd.Series, low: pd.Series, close: pd.Series, n: int = 14, tr: pd.Series | None = None):
+    if talib is not None:
+        hv, lv, cv = _np(high), _np(low), _np(close)
+        adx = pd.Series(talib.ADX(hv, lv, cv, n), index=close.index)
+        plus_di = pd.Series(talib.PLUS_DI(hv, lv, cv, n), index=close.index)
+        minus_di = pd.Series(talib.MINUS_DI(hv, lv, cv, n), index=close.index)
+        return adx, plus_di, minus_di
+
     # +DM and -DM
     up_move = high.diff()
     down_move = -low.diff()
     plus_dm = ((up_move > down_move) & (up_move > 0)).astype(float) * up_move.clip(lower=0.0)
     minus_dm = ((down_move > up_move) & (down_move > 0)).astype(float) * down_move.clip(lower=0.0)
 
-    tr = _true_range(high, low, close)
+    if tr is None:
+        tr = _true_range(high, low, close)
     atr = _wilder_ema(tr, n)
 
     plus_di = 100 * _safe_div(_wilder_ema(plus_dm, n), atr)
@@ -83,8 +150,9 @@ def _macd(close: pd.Series, fast: int = 12, slow: int = 26, signal: int = 9):
     macd_hist = macd_line - macd_signal
     return macd_line, macd_signal, macd_hist
 
-def _bollinger(close: pd.Series, n: int = 20, k: float = 2.0):
-    mid = _sma(close, n)
+def _bollinger(close: pd.Series, n: int = 20, k: float = 2.0, mid: pd.Series | None = None):
+    if mid is None:
+        mid = _sma(close, n)
     stdev = close.rolling(n, min_periods=n).std()
     up = mid + k * stdev
     lo = mid - k * stdev
@@ -94,10 +162,14 @@ def _bollinger(close: pd.Series, n: int = 20, k: float = 2.0):
 
 # ---------- main: feature builder ----------
 
-def build_features(df: pd.DataFrame) -> pd.DataFrame:
+def build_features(df: pd.DataFrame, ctx: AnalyzerContext | None = None) -> pd.DataFrame:
     """
     Input:  DataFrame with columns: date, open, high, low, close, (volume optional)
+            ctx (optional): AnalyzerContext for the same rows (e.g. DataLoader.context),
+                            reuses its cached float64 arrays instead of re-casting
     Output: Original columns + engineered features (no printing, ready for modeling/report)
+            Original columns keep their dtypes; engineered features are float32
+            (day_of_week, month and vol_spike_flag are int8)
     """
     # Ensure required columns exist
     needed = {"date", "open", "high", "low", "close"}
@@ -105,94 +177,129 @@ def build_features(df: pd.DataFrame) -> pd.DataFrame:
     if missing:
         raise ValueError(f"Missing required columns for features: {sorted(missing)}")
 
-    out = df.copy()
-    out = out.sort_values("date").reset_index(drop=True)
+    # Existing columns are never modified, so no copy is needed
+    out = df
+    if not out["date"].is_monotonic_increasing:
+        out = out.sort_values("date")
+        ctx = None  # its arrays follow the unsorted row order
+    if not out.index.equals(pd.RangeIndex(len(out))):
+        out = out.reset_index(drop=True)
+
+    if ctx is not None:
+        if len(ctx) != len(out):
+            raise ValueError("AnalyzerContext rows do not match the DataFrame")
+        o, h, l, c = (pd.Series(ctx.f64(col), index=out.index) for col in ["open", "high", "low", "close"])
+    else:
+        o = out["open"].astype(float)
+        h = out["high"].astype(float)
+        l = out["low"].astype(float)
+        c = out["close"].astype(float)
+
+    if "volume" not in out.columns:
+        v = pd.Series(index=out.index, dtype=float)
+    elif ctx is not None:
+        v = pd.Series(ctx.f64("volume"), index=out.index)
+    else:
+        v = out["volume"].astype(float)
 
-    o = out["open"].astype(float)
-    h = out["high"].astype(float)
-    l = out["low"].astype(float)
-    c = out["close"].astype(float)
-    v = out["volume"].astype(float) if "volume" in out.columns else pd.Series(index=out.index, dtype=float)
+    # New columns are collected here and attached in one concat
+    new = {}
 
     # Returns
-    out["ret_1"]  = c.pct_change(1)
-    out["ret_5"]  = c.pct_change(5)
-    out["ret_10"] = c.pct_change(10)
-    out["ret_21"] = c.pct_change(21)
+    new["ret_1"]  = c.pct_change(1)
+    new["ret_5"]  = c.pct_change(5)
+    new["ret_10"] = c.pct_change(10)
+    new["ret_21"] = c.pct_change(21)
 
     # Moving averages (trend)
-    out["sma_5"]   = _sma(c, 5)
-    out["sma_20"]  = _sma(c, 20)
-    out["sma_50"]  = _sma(c, 50)
-    out["sma_200"] = _sma(c, 200)
+    sma = _sma_family(c, (5, 20, 50, 200))
+    new["sma_5"]   = sma[5]
+    new["sma_20"]  = sma[20]
+    new["sma_50"]  = sma[50]
+    new["sma_200"] = sma[200]
 
-    out["ema_12"] = _ema(c, 12)
-    out["ema_26"] = _ema(c, 26)
-    out["ema_50"] = _ema(c, 50)
+    new["ema_12"] = _ema(c, 12)
+    new["ema_26"] = _ema(c, 26)
+    new["ema_50"] = _ema(c, 50)
 
     # MACD
     macd_line, macd_signal, macd_hist = _macd(c, 12, 26, 9)
-    out["macd_line"]   = macd_line
-    out["macd_signal"] = macd_signal
-    out["macd_hist"]   = macd_hist
+    new["macd_line"]   = macd_line
+    new["macd_signal"] = macd_signal
+    new["macd_hist"]   = macd_hist
 
     # RSI
-    out["rsi_14"] = _rsi(c, 14)
-    out["rsi14"] = out["rsi_14"]    # <-- REQUIRED for Model()
-
-
-    # ATR / TR
-    tr, atr_14 = _atr(h, l, c, 14)
-    out["tr"] = tr
-    out["atr_14"] = atr_14
-    out["atr14"] = out["atr_14"]    # <-- REQUIRED for Model()
-
+    new["rsi_14"] = _rsi(c, 14)
 
+    # ATR / TR (TR computed once, shared with ADX)
+    tr, atr_14 = _atr(h, l, c, 14, tr=_true_range(h, l, c))
+    new["tr"] = tr
+    new["atr_14"] = atr_14
 
     # ADX + DI
-    adx_14, di_plus_14, di_minus_14 = _adx_di(h, l, c, 14)
-    out["adx_14"] = adx_14
-    out["di_plus_14"] = di_plus_14
-    out["di_minus_14"] = di_minus_14
+    adx_14, di_plus_14, di_minus_14 = _adx_di(h, l, c, 14, tr=tr)
+    new["adx_14"] = adx_14
+    new["di_plus_14"] = di_plus_14
+    new["di_minus_14"] = di_minus_14
 
     # Bollinger Bands (20, 2)
-    bb_mid_20, bb_up, bb_lo, bb_width, bb_stdev = _bollinger(c, 20, 2.0)
-    out["bb_mid_20"]   = bb_mid_20
-    out["bb_up_20_2"]  = bb_up
-    out["bb_lo_20_2"]  = bb_lo
-    out["bb_width_20"] = bb_width
-    out["stdev_20"]    = bb_stdev  # keep raw stdev(20) too
+    bb_mid_20, bb_up, bb_lo, bb_width, bb_stdev = _bollinger(c, 20, 2.0, mid=sma[20])
+    new["bb_mid_20"]   = bb_mid_20
+    new["bb_up_20_2"]  = bb_up
+    new["bb_lo_20_2"]  = bb_lo
+    new["bb_width_20"] = bb_width
+    new["stdev_20"]    = bb_stdev  # keep raw stdev(20) too
 
     # Volatility (extra)
-    out["stdev_10"] = c.pct_change(1).rolling(10, min_periods=10).std()
+    new["stdev_10"] = c.pct_change(1).rolling(10, min_periods=10).std()
 
     # BB width percentile vs. ~1yr (252 trading days)
-    out["bb_width_pct_252"] = _rolling_percentile_current_value(out["bb_width_20"], 252)
+    new["bb_width_pct_252"] = _rolling_percentile_current_value(new["bb_width_20"], 252)
 
     # Volume stats (if available)
     if "volume" in df.columns:
-        out["vol_ma20"] = _sma(v, 20)
-        out["vol_ratio"] = _safe_div(v, out["vol_ma20"])
-        out["vol_spike_flag"] = (out["vol_ratio"] >= 1.5).astype(int)
+        new["vol_ma20"] = _sma(v, 20)
+        new["vol_ratio"] = _safe_div(v, new["vol_ma20"])
+        new["vol_spike_flag"] = (new["vol_ratio"] >= 1.5).astype(np.int8)
     else:
-        out["vol_ma20"] = np.nan
-        out["vol_ratio"] = np.nan
-        out["vol_spike_flag"] = 0
+        new["vol_ma20"] = np.nan
+        new["vol_ratio"] = np.nan
+        new["vol_spike_flag"] = np.zeros(len(out), dtype=np.int8)
 
     # Candle strength metrics
-    range_ = (h - l).replace(0, np.nan)
-    body = (c - o).abs()
-    upper_wick = (h - c).where(c >= o, h - o)  # if green candle: h-c ; if red: h-o
-    lower_wick = (o - l).where(c >= o, c - l)  # if green: o-l ; if red: c-l
-
-    out["body_pct"]       = _safe_div(body, range_)
-    out["upper_wick_pct"] = _safe_div(upper_wick, range_)
-    out["lower_wick_pct"] = _safe_div(lower_wick, range_)
+    ov, hv, lv, cv = o.to_numpy(), h.to_numpy(), l.to_numpy(), c.to_numpy()
+    range_ = hv - lv
+    range_ = np.where(range_ == 0, np.nan, range_)
+    body = np.abs(cv - ov)
+    green = cv >= ov
+    upper_wick = np.where(green, hv - cv, hv - ov)  # if green candle: h-c ; if red: h-o
+    lower_wick = np.where(green, ov - lv, cv - lv)  # if green: o-l ; if red: c-l
+
+    new["body_pct"]       = body / range_
+    new["upper_wick_pct"] = upper_wick / range_
+    new["lower_wick_pct"] = lower_wick / range_
 
     # Time context
-    dt = pd.to_datetime(out["date"])
-    out["day_of_week"] = dt.dt.dayofweek  # 0=Mon ... 6=Sun
-    out["month"] = dt.dt.month
+    dt = out["date"]
+    if not pd.api.types.is_datetime64_any_dtype(dt):
+        dt = pd.to_datetime(dt)
+    elif getattr(dt.dt, "tz", None) is not None:
+        dt = dt.dt.tz_localize(None)  # keep local wall-clock dates
+
+    if dt.isna().any():
+        new["day_of_week"] = dt.dt.dayofweek  # 0=Mon ... 6=Sun
+        new["month"] = dt.dt.month
+    else:
+        # Straight from the int64 day count (1970-01-01 was a Thursday)
+        days = dt.to_numpy(dtype="datetime64[D]")
+        new["day_of_week"] = ((days.view("i8") - 4) % 7).astype(np.int8)  # 0=Mon ... 6=Sun
+        new["month"] = (days.astype("datetime64[M]").view("i8") % 12 + 1).astype(np.int8)
+
+    # Previous feature columns (re-run on a feature frame) are replaced
+    overlap = out.columns.intersection(list(new))
+    if len(overlap):
+        out = out.drop(columns=overlap)
+    out = pd.concat([out, pd.DataFrame(new, index=out.index)], axis=1)
 
     # Clean up NaNs from rolling windows at the head
     out = out.replace([np.inf, -np.inf], np.nan)
@@ -211,4 +318,98 @@ def build_features(df: pd.DataFrame) -> pd.DataFrame:
 
     out["trend"] = out.apply(classify_trend, axis=1)
 
+    # Downcast features (computed in float64 above) to float32
+    floats = [k for k in new if out[k].dtype == np.float64]
+    out = out.astype(dict.fromkeys(floats, np.float32))
+
+    return out
+
+
+# ---------- disk cache ----------
+
+FEATURES_CACHE_DIR = ".cache"
+FEATURES_CACHE_KEEP = 32  # newest feature files kept; older ones are deleted on write
+_FEATURES_CACHE_VERSION = 5  # bump when build_features output changes
+
+
+def _features_cache_path(path: str, cache_dir: str) -> str:
+    # Keyed on the source file identity (path, mtime, size) and on whether
+    # TA-Lib computed the Wilder indicators (its warm-up differs from pandas)
+    st = os.stat(path)
+    ident = (
+        f"{_FEATURES_CACHE_VERSION}|{talib is not None}|"
+        f"{os.path.abspath(path)}|{st.st_mtime_ns}|{st.st_size}"
+    )
+    key = hashlib.blake2b(ident.encode(), digest_size=16).hexdigest()
+    return os.path.join(cache_dir, f"features-{key}.npz")
+
+
+def _save_frame(df: pd.DataFrame, cache_path: str) -> None:
+    # One array per column in an .npz; str columns are stored as fixed-width
+    # unicode so loading never needs pickle. Frames with other object
+    # columns are not cached.
+    arrays = {}
+    str_cols = []
+    for i, col in enumerate(df.columns):
+        arr = df[col].to_numpy()
+        if arr.dtype == object:
+            if not all(isinstance(x, str) for x in arr):
+                return
+            arr = arr.astype(str)
+            str_cols.append(col)
+        arrays[f"c{i}"] = arr
+    arrays["columns"] = np.array(df.columns, dtype=str)
+    arrays["str_columns"] = np.array(str_cols, dtype=str)
+
+    # Write to a temp file and swap it in, so readers never see a partial file
+    os.makedirs(os.path.dirname(cache_path) or ".", exist_ok=True)
+    tmp = f"{cache_path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        np.savez(f, **arrays)
+    os.replace(tmp, cache_path)
+
+
+def _load_frame(cache_path: str) -> pd.DataFrame:
+    with np.load(cache_path, allow_pickle=False) as z:
+        columns = z["columns"].tolist()
+        str_cols = set(z["str_columns"].tolist())
+        data = {
+            col: z[f"c{i}"].astype(object) if col in str_cols else z[f"c{i}"]
+            for i, col in enumerate(columns)
+        }
+    return pd.DataFrame(data, columns=columns)
+
+
+def build_features_cached(
+    df: pd.DataFrame,
+    path: str | None = None,
+    ctx: AnalyzerContext | None = None,
+    cache_dir: str = FEATURES_CACHE_DIR,
+    min_seconds: float = 0.05,
+) -> pd.DataFrame:
+    """
+    build_features memoized on disk for DataFrames loaded from `path`.
+    The cache is keyed on the CSV's path, mtime and size, so editing the file
+    invalidates it. Results are only written when building them took at least
+    `min_seconds` (cheap inputs are not worth the disk round trip).
+    Cache files are plain .npz arrays (loaded without pickle); only the
+    newest FEATURES_CACHE_KEEP of them are kept.
+    Without a path (in-memory data) this is just build_features.
+    """
+    if path is None:
+        return build_features(df, ctx)
+
+    cache_path = _features_cache_path(path, cache_dir)
+    if os.path.exists(cache_path):
+        try:
+            return _load_frame(cache_path)
+        except (OSError, ValueError, KeyError, zipfile.BadZipFile):
+            pass  # corrupt / incompatible cache file: rebuild it
+
+    start = time.perf_counter()
+    out = build_features(df, ctx)
+    if time.perf_counter() - start >= min_seconds:
+        _save_frame(out, cache_path)
+        prune_cache(cache_dir, "features-*.npz", FEATURES_CACHE_KEEP)
+
     return out
@@ -1,119 +1,166 @@
+import numpy as np
 import pandas as pd
 
+from .patterns import PATTERNS as PATTERN_BITS
+
+# Candidate primary patterns, in priority order
+PATTERNS = [
+    "bullish_engulfing", "bearish_engulfing",
+    "hammer", "shooting_star",
+    "morning_star", "evening_star",
+    "inside_bar", "outside_bar"
+]
+
+# State labels; the position is the code used in the packed condition key
+TRENDS = ["bullish", "bearish", "neutral"]
+MOMENTUM_STATES = ["bullish", "bearish", "neutral"]
+VOLATILITY_STATES = ["high", "low", "normal"]
+
+# A "similar historical case" is packed in one uint16:
+# bits 0-3 primary pattern (len(PATTERNS) = none), 4-5 trend,
+# 6-7 momentum, 8-9 volatility (3 = unknown label)
+_KEY_SIZE = 1 << 10
+
+
+def _state_codes(values, labels) -> np.ndarray:
+    codes = pd.Categorical(values, categories=labels).codes  # -1 = unknown label
+    return np.where(codes < 0, 3, codes).astype(np.uint16)
+
+
 class Model:
     def __init__(self, df: pd.DataFrame):
         """
         df must already contain:
-        - features (RSI, MACD, ATR, etc.)
+        - features (rsi_14, macd_hist, atr_14, etc.)
         - patterns (hammer, engulfing, etc.)
         - trend column
         """
-        self.df = df.copy().reset_index(drop=True)
+        # Shallow copy: new columns stay local, the data is shared
+        self.df = df.copy(deep=False)
+        self.df.index = pd.RangeIndex(len(df))
         self.hybrid_prob = None
+        self._table = None
+
+        # Pattern flags as one (N, k) bool matrix, columns in PATTERNS order
+        if "pattern_code" in self.df.columns:
+            # Unpack from the bit-packed column instead of reading k bool columns
+            self._pattern_cols = list(PATTERNS)
+            bits = np.array([PATTERN_BITS.index(p) for p in PATTERNS], dtype=np.uint16)
+            codes = self.df["pattern_code"].to_numpy(dtype=np.uint16)
+            self._pattern_mat = ((codes[:, None] >> bits) & 1).astype(bool)
+        else:
+            self._pattern_cols = [p for p in PATTERNS if p in self.df.columns]
+            self._pattern_mat = self.df[self._pattern_cols].to_numpy(dtype=bool)
+
+        # Raw arrays of the columns used on the hot paths
+        self._rsi = self.df["rsi_14"].to_numpy(dtype=float)
+        self._hist = self.df["macd_hist"].to_numpy(dtype=float)
+        self._atr = self.df["atr_14"].to_numpy(dtype=float)
+        self._trend = self.df["trend"].to_numpy()
+
+        # Momentum / volatility state of every row, computed once
+        rsi, hist, atr = self._rsi, self._hist, self._atr
+
+        # RSI above 55 = bullish momentum, below 45 = bearish momentum
+        self._momentum_codes = np.where(
+            (rsi > 55) & (hist > 0), 0,
+            np.where((rsi < 45) & (hist < 0), 1, 2)
+        ).astype(np.uint16)
+        self._momentum = np.array(MOMENTUM_STATES, dtype=object)[self._momentum_codes]
+
+        # ATR vs. its median over the whole history
+        self._median_atr = float(np.nanmedian(atr)) if len(atr) else np.nan
+        self._volatility_codes = np.where(
+            atr > self._median_atr * 1.2, 0,
+            np.where(atr < self._median_atr * 0.8, 1, 2)
+        ).astype(np.uint16)
+        self._volatility = np.array(VOLATILITY_STATES, dtype=object)[self._volatility_codes]
     
-    def _momentum_state(self, df):
-        """Classifies momentum based on RSI and MACD histogram."""
-        # RSI: above 55 = bullish momentum
-        if df["rsi14"].iloc[-1] > 55 and df["macd_hist"].iloc[-1] > 0:
-            return "bullish"
-
-        # RSI below 45 = bearish momentum
-        if df["rsi14"].iloc[-1] < 45 and df["macd_hist"].iloc[-1] < 0:
-            return "bearish"
-
-        return "neutral"
+    def _momentum_state(self, df=None):
+        """Classifies momentum (of the last candle) based on RSI and MACD histogram."""
+        return self._momentum[-1]
     
-    def _volatility_state(self, df):
-        """Classifies volatility using ATR."""
-        atr_today = df["atr14"].iloc[-1]
-        median_atr = df["atr14"].median()
-
-        if atr_today > median_atr * 1.2:
-            return "high"
-
-        if atr_today < median_atr * 0.8:
-            return "low"
-
-        return "normal"
+    def _volatility_state(self, df=None):
+        """Classifies volatility (of the last candle) using ATR."""
+        return self._volatility[-1]
     
     def classify_states(self):
         df = self.df
 
-        df["momentum_state"] = self._momentum_state(df)
-        df["volatility_state"] = self._volatility_state(df)
+        df["momentum_state"] = self._momentum
+        df["volatility_state"] = self._volatility
+
+        # States changed, the conditional table must be rebuilt
+        self._table = None
 
         return df
 
+    def _condition_keys(self) -> np.ndarray:
+        """Packed (pattern, trend, momentum, volatility) key of every row."""
+        flags = self._pattern_mat
+        if self._pattern_cols:
+            primary = np.where(flags.any(axis=1), flags.argmax(axis=1), len(PATTERNS))
+        else:
+            primary = np.full(len(self.df), len(PATTERNS))
+
+        return (
+            primary.astype(np.uint16)
+            | (_state_codes(self._trend, TRENDS) << 4)
+            | (self._momentum_codes << 6)
+            | (self._volatility_codes << 8)
+        )
+
+    def _build_conditional_table(self):
+        """
+        Precomputes P(next candle bullish) for every combination of
+        primary pattern, trend, momentum and volatility in the history,
+        indexed by the packed condition key (NaN = never seen).
+        """
+        df = self.df
+
+        # What happened on the following candle
+        bullish = df["bullish"].to_numpy(dtype=float)
+        next_bullish = np.full_like(bullish, np.nan)
+        next_bullish[:-1] = bullish[1:]
+        df["next_bullish"] = next_bullish
+
+        # Row i is paired with candle i+1: views, no masking or copies
+        self._keys = self._condition_keys()
+        keys, outcome = self._keys[:-1], bullish[1:]
+        if np.isnan(outcome).any():
+            known = ~np.isnan(outcome)
+            keys, outcome = keys[known], outcome[known]
+
+        # One pass over the keys: per-key count and sum of next_bullish
+        counts = np.bincount(keys, minlength=_KEY_SIZE)
+        sums = np.bincount(keys, weights=outcome, minlength=_KEY_SIZE)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            self._table = sums / counts
+        return self._table
+
 
     def hybrid_probability(self):
         """
         Hybrid probability model:
         - strict match for primary pattern + trend
         - flexible match for momentum + volatility
-        - checks entire history
+        - checks entire history (precomputed once per state, see
+          _build_conditional_table)
         - computes next-candle real bullish probability
         """
 
-        df = self.df.copy()
-
-        # 1. Identify today's conditions
-        last = df.iloc[-1]
-
-        # Primary pattern (strict)
-        patterns = [
-            "bullish_engulfing", "bearish_engulfing",
-            "hammer", "shooting_star",
-            "morning_star", "evening_star",
-            "inside_bar", "outside_bar"
-        ]
-
-        primary_pattern = None
-        for p in patterns:
-            if last.get(p, False):
-                primary_pattern = p
-                break
-
-        # If no pattern, fallback to 'none'
-        if primary_pattern is None:
-            primary_pattern = "none"
-
-        # Trend (strict)
-        current_trend = last["trend"]
-
-        # Momentum (flexible)
-        current_momentum = self._momentum_state(df)
-
-        # Volatility (flexible)
-        current_volatility = self._volatility_state(df)
-
-        # 2. Find similar historical cases
-        matches = df.copy()
-
-        # strict match: same pattern
-        if primary_pattern != "none":
-            matches = matches[matches[primary_pattern] == True]
-
-        # strict match: same trend
-        matches = matches[matches["trend"] == current_trend]
-
-        # flexible match: momentum
-        matches = matches[matches["momentum_state"] == current_momentum]
-
-        # flexible match: volatility
-        matches = matches[matches["volatility_state"] == current_volatility]
-
-        # shift matches forward by 1 to see what happened next
-        next_moves = matches["bullish"].shift(-1)
-
-        # remove NaN (last row)
-        next_moves = next_moves.dropna()
+        if self._table is None:
+            self._build_conditional_table()
 
-        if len(next_moves) == 0:
-            return 50.0  # no information
+        # 1. Today's conditions: primary pattern + trend (strict),
+        #    momentum + volatility (flexible)
+        key = self._keys[-1]
 
-        # probability
-        prob = next_moves.mean() * 100
-        self.hybrid_prob = round(prob, 2)
+        # 2. Look up similar historical cases (50% if there are none)
+        prob = self._table[key]
+        if np.isnan(prob):
+            prob = 0.5
+        self.hybrid_prob = round(float(prob) * 100, 2)
 
         return self.hybrid_prob
 
@@ -124,7 +171,7 @@ class Model:
 
         return {
             "probability_next_bullish": self.hybrid_prob,
-            "last_trend": self.df["trend"].iloc[-1],
+            "last_trend": self._trend[-1],
             "last_momentum": self._momentum_state(self.df),
             "last_volatility": self._volatility_state(self.df)
         }
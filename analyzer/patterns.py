@@ -1,62 +1,102 @@
+import numpy as np
 import pandas as pd
 
-class PatternDetector:
-    def __init__(self, df: pd.DataFrame):
-        # a clean internal copy
-        self.df = df.copy().reset_index(drop=True)
+from .context import AnalyzerContext
+from ._nb import detect_all_nb
+
+# Column order of the pattern matrix (same order detect_all runs them)
+PATTERNS = [
+    "bullish_engulfing", "bearish_engulfing",
+    "hammer", "shooting_star",
+    "doji",
+    "inside_bar", "outside_bar",
+    "morning_star", "evening_star",
+]
 
-        # Normalize column names (just in case)
-        self.df.rename(columns={
-            'Open': 'open',
-            'High': 'high',
-            'Low': 'low',
-            'Close': 'close'
-        }, inplace=True)
 
-        # Convert to float
-        for col in ['open', 'high', 'low', 'close']:
-            self.df[col] = self.df[col].astype(float)
+def pack_patterns(flags: np.ndarray) -> np.ndarray:
+    # (N, 9) bool matrix -> one uint16 per row, bit i = PATTERNS[i]
+    codes = np.zeros(flags.shape[0], dtype=np.uint16)
+    for i in range(flags.shape[1]):
+        codes |= flags[:, i].astype(np.uint16) << i
+    return codes
 
-        # Helpful columns for patterns
-        self.df["bullish"] = self.df["close"] > self.df["open"]
-        self.df["bearish"] = self.df["close"] < self.df["open"]
+
+def _shift(a: np.ndarray, k: int, fill=np.nan) -> np.ndarray:
+    # Positional shift of a 1-D array (like Series.shift), head filled with `fill`
+    out = np.empty_like(a)
+    out[:k] = fill
+    out[k:] = a[:-k]
+    return out
+
+
+class PatternDetector:
+    def __init__(self, df: pd.DataFrame, ctx: AnalyzerContext | None = None):
+        # Normalize column names (just in case)
+        if not {'open', 'high', 'low', 'close'} <= set(df.columns):
+            df = df.rename(columns={
+                'Open': 'open',
+                'High': 'high',
+                'Low': 'low',
+                'Close': 'close'
+            })
+
+        # Keep a reference; patterns are written to their own matrix
+        self.df = df
+
+        # float64 price arrays, shared through the context (the threshold
+        # rules flip on float32 rounding, so the rules use full precision)
+        if ctx is None:
+            ctx = AnalyzerContext(df)
+        elif len(ctx) != len(df):
+            raise ValueError("AnalyzerContext rows do not match the DataFrame")
+        self.ctx = ctx
+        self._o, self._h, self._l, self._c = (ctx.f64(col) for col in ["open", "high", "low", "close"])
+
+        # Helpful arrays for patterns
+        self._bullish = self._c > self._o
+        self._bearish = self._c < self._o
+
+        # One boolean column per pattern, filled by the detectors
+        self._patterns = np.zeros((len(df), len(PATTERNS)), dtype=bool)
+
+    def _store(self, name: str, pattern: np.ndarray) -> pd.Series:
+        i = PATTERNS.index(name)
+        self._patterns[:, i] = pattern
+        return pd.Series(self._patterns[:, i], index=self.df.index, name=name)
 
 
     def bullish_engulfing(self):
-        df = self.df
+        o, c = self._o, self._c
 
         # Conditions for bullish engulfing
-        cond1 = df["bearish"].shift(1)        # Previous candle is bearish
-        cond2 = df["bullish"]                 # Current candle is bullish
-        cond3 = df["open"] < df["close"].shift(1)   # Current open is below previous close
-        cond4 = df["close"] > df["open"].shift(1)   # Current close is above previous open
+        cond1 = _shift(self._bearish, 1, False)   # Previous candle is bearish
+        cond2 = self._bullish                      # Current candle is bullish
+        cond3 = o < _shift(c, 1)                   # Current open is below previous close
+        cond4 = c > _shift(o, 1)                   # Current close is above previous open
 
         pattern = cond1 & cond2 & cond3 & cond4
-        df["bullish_engulfing"] = pattern
-
-        return df["bullish_engulfing"]
+        return self._store("bullish_engulfing", pattern)
 
     def bearish_engulfing(self):
-        df = self.df
+        o, c = self._o, self._c
 
         # Conditions for bearish engulfing
-        cond1 = df["bullish"].shift(1)        # Previous candle is bullish
-        cond2 = df["bearish"]                 # Current candle is bearish
-        cond3 = df["open"] > df["close"].shift(1)   # Current open is above previous close
-        cond4 = df["close"] < df["open"].shift(1)   # Current close is below previous open
+        cond1 = _shift(self._bullish, 1, False)   # Previous candle is bullish
+        cond2 = self._bearish                      # Current candle is bearish
+        cond3 = o > _shift(c, 1)                   # Current open is above previous close
+        cond4 = c < _shift(o, 1)                   # Current close is below previous open
 
         pattern = cond1 & cond2 & cond3 & cond4
-        df["bearish_engulfing"] = pattern
-
-        return df["bearish_engulfing"]
+        return self._store("bearish_engulfing", pattern)
 
     def hammer(self):
-        df = self.df
+        o, h, l, c = self._o, self._h, self._l, self._c
 
         # Calculate candle components
-        body = (df["close"] - df["open"]).abs()
-        upper_wick = df["high"] - df[["open", "close"]].max(axis=1)
-        lower_wick = df[["open", "close"]].min(axis=1) - df["low"]
+        body = np.abs(c - o)
+        upper_wick = h - np.fmax(o, c)
+        lower_wick = np.fmin(o, c) - l
 
         # Hammer conditions
         cond1 = lower_wick >= 2 * body     # big lower shadow
@@ -64,17 +104,15 @@ class PatternDetector:
         cond3 = body > 0                   # avoid division / doji issues
 
         pattern = cond1 & cond2 & cond3
-        df["hammer"] = pattern
-
-        return df["hammer"]
+        return self._store("hammer", pattern)
     
     def shooting_star(self):
-        df = self.df
+        o, h, l, c = self._o, self._h, self._l, self._c
 
         # Candle components
-        body = (df["close"] - df["open"]).abs()
-        upper_wick = df["high"] - df[["open", "close"]].max(axis=1)
-        lower_wick = df[["open", "close"]].min(axis=1) - df["low"]
+        body = np.abs(c - o)
+        upper_wick = h - np.fmax(o, c)
+        lower_wick = np.fmin(o, c) - l
 
         # Shooting Star conditions
         cond1 = upper_wick >= 2 * body     # big upper shadow
@@ -82,9 +120,7 @@ class PatternDetector:
         cond3 = body > 0                   # avoid doji
 
         pattern = cond1 & cond2 & cond3
-        df["shooting_star"] = pattern
-
-        return df["shooting_star"]
+        return self._store("shooting_star", pattern)
 
     def doji(self, threshold: float = 0.1):
         """
@@ -93,120 +129,111 @@ class PatternDetector:
                    default = 10% (0.1) of total range.
         """
 
-        df = self.df
+        o, h, l, c = self._o, self._h, self._l, self._c
 
         # Candle components
-        body = (df["close"] - df["open"]).abs()
-        full_range = df["high"] - df["low"]
+        body = np.abs(c - o)
+        full_range = h - l
 
         # Avoid division by zero
-        full_range = full_range.replace(0, 1)
+        full_range = np.where(full_range == 0, 1.0, full_range)
 
         # Body must be very small
         cond1 = body / full_range <= threshold
 
-        df["doji"] = cond1
-        return df["doji"]
+        return self._store("doji", cond1)
     
     def inside_bar(self):
-        df = self.df
+        h, l = self._h, self._l
 
         # Previous candle's range
-        prev_high = df["high"].shift(1)
-        prev_low = df["low"].shift(1)
+        prev_high = _shift(h, 1)
+        prev_low = _shift(l, 1)
 
         # Inside Bar conditions
-        cond1 = df["high"] <= prev_high
-        cond2 = df["low"] >= prev_low
+        cond1 = h <= prev_high
+        cond2 = l >= prev_low
 
         pattern = cond1 & cond2
-        df["inside_bar"] = pattern
-
-        return df["inside_bar"]
+        return self._store("inside_bar", pattern)
 
     def outside_bar(self):
-        df = self.df
+        h, l = self._h, self._l
 
         # Previous candle's range
-        prev_high = df["high"].shift(1)
-        prev_low = df["low"].shift(1)
+        prev_high = _shift(h, 1)
+        prev_low = _shift(l, 1)
 
         # Outside Bar conditions
-        cond1 = df["high"] >= prev_high
-        cond2 = df["low"] <= prev_low
+        cond1 = h >= prev_high
+        cond2 = l <= prev_low
 
         pattern = cond1 & cond2
-        df["outside_bar"] = pattern
-
-        return df["outside_bar"]
+        return self._store("outside_bar", pattern)
 
     def morning_star(self):
-        df = self.df
+        o, c = self._o, self._c
         
         # Candle components
-        body = (df["close"] - df["open"]).abs()
+        body = np.abs(c - o)
         
         # Shifted components for 3-candle pattern
-        body_prev1 = body.shift(1)
-        body_prev2 = body.shift(2)
+        body_prev1 = _shift(body, 1)
+        body_prev2 = _shift(body, 2)
         
-        close_prev1 = df["close"].shift(1)
-        close_prev2 = df["close"].shift(2)
-        
-        open_prev1 = df["open"].shift(1)
-        open_prev2 = df["open"].shift(2)
+        close_prev2 = _shift(c, 2)
+        open_prev2 = _shift(o, 2)
         
         # Pattern conditions
-        cond1 = df["bearish"].shift(2)                     # Candle 1 bearish
-        cond2 = body_prev1 <= body_prev2 * 0.5             # Candle 2 small body (50% or less)
-        cond3 = df["bullish"]                              # Candle 3 bullish
-        cond4 = df["close"] > (open_prev2 + close_prev2) / 2   # Candle 3 closes into Candle 1's body
+        cond1 = _shift(self._bearish, 2, False)        # Candle 1 bearish
+        cond2 = body_prev1 <= body_prev2 * 0.5         # Candle 2 small body (50% or less)
+        cond3 = self._bullish                          # Candle 3 bullish
+        cond4 = c > (open_prev2 + close_prev2) / 2     # Candle 3 closes into Candle 1's body
         
         pattern = cond1 & cond2 & cond3 & cond4
-        df["morning_star"] = pattern
-        
-        return df["morning_star"]
+        return self._store("morning_star", pattern)
 
     def evening_star(self):
-        df = self.df
+        o, c = self._o, self._c
         
         # Candle components
-        body = (df["close"] - df["open"]).abs()
+        body = np.abs(c - o)
         
         # Shifted components
-        body_prev1 = body.shift(1)
-        body_prev2 = body.shift(2)
+        body_prev1 = _shift(body, 1)
+        body_prev2 = _shift(body, 2)
         
-        close_prev1 = df["close"].shift(1)
-        close_prev2 = df["close"].shift(2)
-        
-        open_prev1 = df["open"].shift(1)
-        open_prev2 = df["open"].shift(2)
+        close_prev2 = _shift(c, 2)
+        open_prev2 = _shift(o, 2)
         
         # Pattern conditions
-        cond1 = df["bullish"].shift(2)                      # Candle 1 bullish
-        cond2 = body_prev1 <= body_prev2 * 0.5              # Candle 2 small
-        cond3 = df["bearish"]                               # Candle 3 bearish
-        cond4 = df["close"] < (open_prev2 + close_prev2) / 2   # Candle 3 closes deep
+        cond1 = _shift(self._bullish, 2, False)        # Candle 1 bullish
+        cond2 = body_prev1 <= body_prev2 * 0.5         # Candle 2 small
+        cond3 = self._bearish                          # Candle 3 bearish
+        cond4 = c < (open_prev2 + close_prev2) / 2     # Candle 3 closes deep
         
         pattern = cond1 & cond2 & cond3 & cond4
-        df["evening_star"] = pattern
-        
-        return df["evening_star"]
+        return self._store("evening_star", pattern)
     
     def detect_all(self):
         """
         Runs all implemented patterns and returns the dataframe
         with all pattern columns included.
+        All nine detectors run fused in a single pass (see _nb.detect_all_nb).
         """
-        self.bullish_engulfing()
-        self.bearish_engulfing()
-        self.hammer()
-        self.shooting_star()
-        self.doji()
-        self.inside_bar()
-        self.outside_bar()
-        self.morning_star()
-        self.evening_star()
-
-        return self.df
+        detect_all_nb(self._o, self._h, self._l, self._c, self._patterns)
+        self.codes = pack_patterns(self._patterns)
+
+        # Build the new columns in one shot and attach them to the input
+        flags = pd.DataFrame(self._patterns, columns=PATTERNS, index=self.df.index, copy=False)
+        flags.insert(0, "bearish", self._bearish)
+        flags.insert(0, "bullish", self._bullish)
+        flags["pattern_code"] = self.codes  # all flags bit-packed (see pack_patterns)
+
+        # Re-running on an already-detected frame replaces the old columns
+        overlap = flags.columns.intersection(self.df.columns)
+        base = self.df.drop(columns=overlap) if len(overlap) else self.df
+
+        out = pd.concat([base, flags], axis=1)
+        out.index = pd.RangeIndex(len(out))
+        return out
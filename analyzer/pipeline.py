@@ -0,0 +1,19 @@
+import pandas as pd
+
+from .features import build_features_cached
+from .patterns import PatternDetector
+from .model import Model
+
+
+def run_pipeline(df: pd.DataFrame, path: str | None = None):
+    """
+    Features -> patterns -> model in one call (three passes over the rows;
+    each stage runs its own numba kernels).
+
+    Input:  DataFrame from DataLoader.load_csv()
+            path (optional): source CSV, enables the on-disk features cache
+    Output: (DataFrame with features + patterns, Model.summary() dict)
+    """
+    feats = build_features_cached(df, path)
+    feats = PatternDetector(feats).detect_all()
+    return feats, Model(feats).summary()
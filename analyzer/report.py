@@ -1,14 +1,159 @@
-import pandas as pd
-import matplotlib
-matplotlib.use("Agg")  # Avoid GUI issues when generating charts
-import matplotlib.pyplot as plt
-from matplotlib.patches import Rectangle
-
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Image
-from reportlab.lib.styles import getSampleStyleSheet
-from reportlab.lib.pagesizes import letter
-from reportlab.lib.enums import TA_CENTER
-from reportlab.lib.units import inch
+import hashlib
+import io
+import os
+
+import numpy as np
+
+from ._cache import prune_cache
+from ._nb import candle_geom
+
+# matplotlib and reportlab are imported on first use (plot_candles /
+# export_pdf), so importing this module stays cheap for the CLI prompt.
+
+# Paragraph styles (title, body), parsed once on first export_pdf
+_STYLES = None
+
+
+def _pdf_styles():
+    global _STYLES
+    if _STYLES is None:
+        from reportlab.lib.styles import getSampleStyleSheet
+        sheet = getSampleStyleSheet()
+        _STYLES = sheet["Title"], sheet["BodyText"]
+    return _STYLES
+
+
+# Pattern flags listed in the summary, in display order
+_PATTERN_COLS = [
+    "bullish_engulfing", "bearish_engulfing",
+    "hammer", "shooting_star",
+    "morning_star", "evening_star",
+    "inside_bar", "outside_bar"
+]
+
+# Sentences for generate_detailed_analysis, keyed by model state
+_TREND = {
+    "uptrend": (
+        "The stock is in an <b>uptrend</b>, with price trading above key moving averages. "
+        "This environment typically favors bullish continuation."
+    ),
+    "downtrend": (
+        "The stock is in a <b>downtrend</b>, reflecting consistent selling pressure. "
+        "Bullish signals tend to have weaker follow-through here."
+    ),
+    "sideways": "The stock is currently <b>sideways</b>, showing consolidation and indecision.",
+}
+
+_MOM = {
+    "bullish": "Momentum indicators reflect <b>bullish strength</b>, suggesting buyers are in control.",
+    "bearish": "Momentum indicators show <b>bearish pressure</b>, indicating sellers dominate.",
+    "neutral": "Momentum is <b>neutral</b>, showing no strong directional force.",
+}
+
+_VOL = {
+    "high": (
+        "Volatility is <b>high</b>, producing larger price swings. "
+        "This increases opportunity but also risk."
+    ),
+    "low": "Volatility is <b>low</b>, often preceding a breakout or expansion in price range.",
+    "normal": "Volatility is at a <b>normal</b> level, indicating stable price movement.",
+}
+
+_PATTERNS_FOUND = (
+    "The following candle pattern(s) were detected: <b>{patterns}</b>. "
+    "These patterns, combined with trend and momentum, provide meaningful signals."
+)
+_PATTERNS_NONE = "No major candle patterns were detected in the most recent candle."
+
+_PROB = {
+    "high": (
+        "The model assigns a <b>{prob}% probability</b> that the next candle will be bullish. "
+        "This indicates favorable bullish conditions."
+    ),
+    "low": (
+        "The model estimates only <b>{prob}% probability</b> of a bullish candle, "
+        "signaling stronger bearish conditions."
+    ),
+    "mid": "The model shows a <b>{prob}% probability</b>, indicating neutral or mixed conditions.",
+}
+
+_TAIL = (
+    "This analysis incorporates trend structure, momentum strength, volatility levels, and "
+    "candle patterns to estimate likely future price behavior."
+)
+
+
+def _prob_bucket(prob):
+    return "high" if prob >= 60 else "low" if prob <= 40 else "mid"
+
+
+# Chart markers: (pattern, color, marker, size, anchored at low/high)
+_MARKERS = [
+    ("bullish_engulfing", "green", "^", 60, "low"),
+    ("bearish_engulfing", "red", "v", 60, "high"),
+    ("hammer", "blue", "o", 50, "low"),
+    ("shooting_star", "purple", "o", 50, "high"),
+    ("morning_star", "gold", "*", 120, "low"),
+    ("evening_star", "black", "*", 120, "high"),
+]
+
+# Above this many candles, plot_candles merges adjacent candles into one bar
+_MAX_CANDLES = 2000
+
+# rc overrides for the PNG-only chart: simplify long paths, draw them in
+# chunks, and skip layout/bbox work on save
+_CHART_RC = {
+    "path.simplify": True,
+    "path.simplify_threshold": 1.0,
+    "agg.path.chunksize": 10000,
+    "figure.autolayout": False,
+    "savefig.bbox": "standard",
+}
+
+# Rendered charts are cached as PNGs keyed on the plotted data
+CHART_CACHE_DIR = ".cache"
+CHART_CACHE_KEEP = 32  # newest chart PNGs kept; older ones are deleted on write
+_CHART_CACHE_VERSION = 2  # bump when the chart drawing changes
+_PNG_HEAD = b"\x89PNG\r\n\x1a\n"
+_PNG_TAIL = b"IEND\xaeB`\x82"  # IEND chunk type + CRC, always last
+
+# Chart figure reused across plot_candles calls (built on first use)
+_FIG, _AX = None, None
+
+
+def _chart_axes():
+    """Returns the shared chart Axes, cleared for a new chart."""
+    global _FIG, _AX
+    if _FIG is None:
+        import matplotlib.pyplot as plt
+        _FIG, _AX = plt.subplots(figsize=(12, 6))
+        _FIG.set_layout_engine("constrained")
+    else:
+        _AX.cla()
+    return _FIG, _AX
+
+
+def _chart_key(df):
+    """Content hash of everything plot_candles draws for these rows."""
+    cols = ["open", "high", "low", "close"]
+    cols += [c for c in [m[0] for m in _MARKERS] + ["ema_short", "ema_long"] if c in df.columns]
+    h = hashlib.blake2b(digest_size=16)
+    h.update(f"{_CHART_CACHE_VERSION}|{','.join(cols)}".encode())
+    for c in cols:
+        h.update(np.ascontiguousarray(df[c].to_numpy()).tobytes())
+    return h.hexdigest()
+
+
+def _read_cached_png(cache_path):
+    """Cached chart bytes, or None when missing or not a complete PNG (cache miss)."""
+    try:
+        with open(cache_path, "rb") as f:
+            png = f.read()
+    except OSError:
+        return None
+    if not (png.startswith(_PNG_HEAD) and png.endswith(_PNG_TAIL)):
+        return None
+    return png
 
 
 class Report:
@@ -20,242 +165,235 @@ class Report:
         self.df = df
         self.model_output = model_output
 
+        # Chart PNG from the last plot_candles call and its content key
+        self._chart_key = None
+        self._chart_png = None
+
+        # Last row and its active patterns, shared by both text sections
+        self._last = df.iloc[-1]
+        cols = set(df.columns)
+        present = [p for p in _PATTERN_COLS if p in cols]
+        flags = self._last[present].to_numpy(dtype=bool)
+        self._active_patterns = [
+            present[i].replace("_", " ").title() for i in np.flatnonzero(flags)
+        ]
+
     # =========================================================
     # 1. SUMMARY SECTION
     # =========================================================
     def generate_text_summary(self):
-        last = self.df.iloc[-1]
-
         prob = self.model_output["probability_next_bullish"]
         trend = self.model_output["last_trend"]
         momentum = self.model_output["last_momentum"]
         volatility = self.model_output["last_volatility"]
 
-        pattern_cols = [
-            "bullish_engulfing", "bearish_engulfing",
-            "hammer", "shooting_star",
-            "morning_star", "evening_star",
-            "inside_bar", "outside_bar"
-        ]
-
-        active_patterns = [
-            p.replace("_", " ").title()
-            for p in pattern_cols
-            if p in self.df.columns and last.get(p, False)
-        ]
-
-        patterns_text = ", ".join(active_patterns) if active_patterns else "None"
-
-        summary = f"""
-        <b>Summary of Last Candle</b><br/><br/>
-        <b>Trend:</b> {trend}<br/>
-        <b>Momentum:</b> {momentum}<br/>
-        <b>Volatility:</b> {volatility}<br/>
-        <b>Detected Patterns:</b> {patterns_text}<br/>
-        <b>Probability of Next Bullish Candle:</b> {prob}%<br/>
-        """
+        patterns_text = ", ".join(self._active_patterns) if self._active_patterns else "None"
 
-        return summary
+        return "".join([
+            "<b>Summary of Last Candle</b><br/><br/>",
+            "<b>Trend:</b> ", str(trend), "<br/>",
+            "<b>Momentum:</b> ", str(momentum), "<br/>",
+            "<b>Volatility:</b> ", str(volatility), "<br/>",
+            "<b>Detected Patterns:</b> ", patterns_text, "<br/>",
+            "<b>Probability of Next Bullish Candle:</b> ", str(prob), "%<br/>",
+        ])
 
     # =========================================================
     # 2. DETAILED ANALYSIS
     # =========================================================
     def generate_detailed_analysis(self):
-        last = self.df.iloc[-1]
-
         prob = self.model_output["probability_next_bullish"]
         trend = self.model_output["last_trend"]
         momentum = self.model_output["last_momentum"]
         volatility = self.model_output["last_volatility"]
 
-        pattern_cols = [
-            "bullish_engulfing", "bearish_engulfing",
-            "hammer", "shooting_star",
-            "morning_star", "evening_star",
-            "inside_bar", "outside_bar"
-        ]
-
-        active_patterns = [
-            p.replace("_", " ").title()
-            for p in pattern_cols
-            if p in self.df.columns and last.get(p, False)
-        ]
-
-        analysis = []
-
-        # TREND ANALYSIS
-        if trend == "uptrend":
-            analysis.append(
-                "The stock is in an <b>uptrend</b>, with price trading above key moving averages. "
-                "This environment typically favors bullish continuation."
-            )
-        elif trend == "downtrend":
-            analysis.append(
-                "The stock is in a <b>downtrend</b>, reflecting consistent selling pressure. "
-                "Bullish signals tend to have weaker follow-through here."
-            )
-        else:
-            analysis.append(
-                "The stock is currently <b>sideways</b>, showing consolidation and indecision."
-            )
-
-        # MOMENTUM ANALYSIS
-        if momentum == "bullish":
-            analysis.append(
-                "Momentum indicators reflect <b>bullish strength</b>, suggesting buyers are in control."
-            )
-        elif momentum == "bearish":
-            analysis.append(
-                "Momentum indicators show <b>bearish pressure</b>, indicating sellers dominate."
-            )
-        else:
-            analysis.append("Momentum is <b>neutral</b>, showing no strong directional force.")
-
-        # VOLATILITY ANALYSIS
-        if volatility == "high":
-            analysis.append(
-                "Volatility is <b>high</b>, producing larger price swings. This increases opportunity but also risk."
-            )
-        elif volatility == "low":
-            analysis.append(
-                "Volatility is <b>low</b>, often preceding a breakout or expansion in price range."
-            )
-        else:
-            analysis.append("Volatility is at a <b>normal</b> level, indicating stable price movement.")
-
-        # PATTERN ANALYSIS
-        if active_patterns:
-            analysis.append(
-                f"The following candle pattern(s) were detected: <b>{', '.join(active_patterns)}</b>. "
-                "These patterns, combined with trend and momentum, provide meaningful signals."
-            )
-        else:
-            analysis.append("No major candle patterns were detected in the most recent candle.")
-
-        # PROBABILITY INTERPRETATION
-        if prob >= 60:
-            analysis.append(
-                f"The model assigns a <b>{prob}% probability</b> that the next candle will be bullish. "
-                "This indicates favorable bullish conditions."
-            )
-        elif prob <= 40:
-            analysis.append(
-                f"The model estimates only <b>{prob}% probability</b> of a bullish candle, "
-                "signaling stronger bearish conditions."
-            )
+        if self._active_patterns:
+            patterns = _PATTERNS_FOUND.format(patterns=", ".join(self._active_patterns))
         else:
-            analysis.append(
-                f"The model shows a <b>{prob}% probability</b>, indicating neutral or mixed conditions."
-            )
-
-        analysis.append(
-            "This analysis incorporates trend structure, momentum strength, volatility levels, and "
-            "candle patterns to estimate likely future price behavior."
-        )
+            patterns = _PATTERNS_NONE
+
+        analysis = [
+            _TREND.get(trend, _TREND["sideways"]),
+            _MOM.get(momentum, _MOM["neutral"]),
+            _VOL.get(volatility, _VOL["normal"]),
+            patterns,
+            _PROB[_prob_bucket(prob)].format(prob=prob),
+            _TAIL,
+        ]
 
         return "<br/><br/>".join(analysis)
 
     # =========================================================
     # 3. CANDLE CHART WITH PATTERN MARKERS
     # =========================================================
-    def plot_candles(self, save_path="chart.png", last=100):
-        df = self.df.tail(last).reset_index(drop=True)
-
-        fig, ax = plt.subplots(figsize=(12, 6))
-
-        for i, row in df.iterrows():
-            o = row["open"]
-            c = row["close"]
-            h = row["high"]
-            l = row["low"]
-
-            color = "green" if c > o else "red"
-
-            # Wick
-            ax.plot([i, i], [l, h], color=color, linewidth=1)
-
-            # Body
-            rect = Rectangle(
-                (i - 0.3, min(o, c)),
-                0.6,
-                abs(c - o),
-                color=color
-            )
-            ax.add_patch(rect)
+    def plot_candles(self, buf=None, last=100, cache_dir=CHART_CACHE_DIR):
+        """
+        Renders the last `last` candles as PNG into `buf` (a new BytesIO
+        when None) and returns it rewound, ready for export_pdf.
+        The PNG is cached on disk by chart content, so unchanged data is not
+        redrawn; only the newest CHART_CACHE_KEEP charts are kept.
+        """
+        # Positional slice of the last rows; x positions come from np.arange below
+        df = self.df.iloc[max(len(self.df) - last, 0):]
+        key = _chart_key(df)
+
+        if key != self._chart_key:
+            cache_path = os.path.join(cache_dir, f"chart-{key}.png")
+            png = _read_cached_png(cache_path)
+            if png is None:
+                png = self._render_chart(df)
+                # Write to a temp file and swap it in, so readers never see a partial PNG
+                os.makedirs(cache_dir, exist_ok=True)
+                tmp = f"{cache_path}.{os.getpid()}.tmp"
+                with open(tmp, "wb") as f:
+                    f.write(png)
+                os.replace(tmp, cache_path)
+                prune_cache(cache_dir, "chart-*.png", CHART_CACHE_KEEP)
+            self._chart_key, self._chart_png = key, png
+
+        if buf is None:
+            return io.BytesIO(self._chart_png)
+        if not hasattr(buf, "write"):
+            with open(buf, "wb") as f:
+                f.write(self._chart_png)
+            return buf
+        buf.write(self._chart_png)
+        if hasattr(buf, "seek"):
+            buf.seek(0)
+        return buf
+
+    def _render_chart(self, df):
+        """Draws the chart for the selected rows and returns the PNG bytes."""
+        import matplotlib
+        matplotlib.use("Agg")  # Avoid GUI issues when generating charts
+        import matplotlib.pyplot as plt
+        from matplotlib.collections import LineCollection, PatchCollection
+        from matplotlib.patches import Rectangle
+
+        buf = io.BytesIO()
+        with plt.style.context(_CHART_RC):
+            # Too many candles for the chart: merge every k adjacent rows into one OHLC bar
+            k = -(-len(df) // _MAX_CANDLES)
+            if k > 1:
+                agg = {"open": "first", "high": "max", "low": "min", "close": "last"}
+                agg.update({m[0]: "max" for m in _MARKERS if m[0] in df.columns})
+                agg.update({e: "last" for e in ("ema_short", "ema_long") if e in df.columns})
+                df = df.groupby(np.arange(len(df)) // k).agg(agg)
+
+            fig, ax = _chart_axes()
+
+            # Price columns as float32 arrays (plenty for plotting), indexed by position below
+            arr = df[["open", "high", "low", "close"]].to_numpy(dtype=np.float32)
+            o, h, l, c = arr[:, 0], arr[:, 1], arr[:, 2], arr[:, 3]
+            idx = np.arange(len(df))
+            segments, body_bot, body_h, up = candle_geom(o, h, l, c)
+            colors = np.where(up, "green", "red")
+
+            # Wicks: one segment per candle, drawn as a single collection
+            ax.add_collection(LineCollection(segments, colors=colors, linewidths=1))
+
+            # Bodies: one rectangle per candle, drawn as a single collection
+            # (geometry is precomputed; tolist() hands Rectangle plain floats)
+            rects = [
+                Rectangle((i - 0.3, bot), 0.6, height)
+                for i, bot, height in zip(idx.tolist(), body_bot.tolist(), body_h.tolist())
+            ]
+            ax.add_collection(PatchCollection(rects, facecolors=colors, edgecolors=colors))
+
+            ax.autoscale_view()
 
             # === PATTERN MARKERS ===
-            if "bullish_engulfing" in df.columns and row["bullish_engulfing"]:
-                ax.scatter(i, l, color="green", marker="^", s=60)
-
-            if "bearish_engulfing" in df.columns and row["bearish_engulfing"]:
-                ax.scatter(i, h, color="red", marker="v", s=60)
-
-            if "hammer" in df.columns and row["hammer"]:
-                ax.scatter(i, l, color="blue", marker="o", s=50)
-
-            if "shooting_star" in df.columns and row["shooting_star"]:
-                ax.scatter(i, h, color="purple", marker="o", s=50)
-
-            if "morning_star" in df.columns and row["morning_star"]:
-                ax.scatter(i, l, color="gold", marker="*", s=120)
-
-            if "evening_star" in df.columns and row["evening_star"]:
-                ax.scatter(i, h, color="black", marker="*", s=120)
-
-        # EMA LINES
-        if "ema_short" in df.columns:
-            ax.plot(df.index, df["ema_short"], label="EMA Short", color="blue", linewidth=1.5)
-
-        if "ema_long" in df.columns:
-            ax.plot(df.index, df["ema_long"], label="EMA Long", color="orange", linewidth=1.5)
-
-        ax.set_title("Candlestick Chart (with Patterns)")
-        ax.set_xlabel("Index")
-        ax.set_ylabel("Price")
-        ax.legend()
-
-        plt.tight_layout()
-        plt.savefig(save_path, dpi=200)
-        plt.close()
-
-        return save_path
+            # One scatter per (marker, size) group, colors given per point
+            cols = set(df.columns)
+            markers = [m for m in _MARKERS if m[0] in cols]
+            flags = df[[m[0] for m in markers]].to_numpy(dtype=bool)
+            groups = {}
+            for j, (_, color, marker, size, anchor) in enumerate(markers):
+                rows = np.flatnonzero(flags[:, j])
+                xs, ys, cs = groups.setdefault((marker, size), ([], [], []))
+                xs.append(rows)
+                ys.append((l if anchor == "low" else h)[rows])
+                cs.extend([color] * len(rows))
+
+            for (marker, size), (xs, ys, cs) in groups.items():
+                ax.scatter(np.concatenate(xs), np.concatenate(ys), color=cs, marker=marker, s=size)
+
+            # EMA LINES
+            if "ema_short" in cols:
+                ax.plot(idx, df["ema_short"].to_numpy(), label="EMA Short", color="blue", linewidth=1.5)
+
+            if "ema_long" in cols:
+                ax.plot(idx, df["ema_long"].to_numpy(), label="EMA Long", color="orange", linewidth=1.5)
+
+            title = "Candlestick Chart (with Patterns)"
+            if k > 1:
+                title += f" - {k} candles per bar"
+            ax.set_title(title)
+            ax.set_xlabel("Index")
+            ax.set_ylabel("Price")
+            ax.legend()
+
+            # Low zlib level: the PNG is re-encoded into the PDF anyway
+            fig.savefig(buf, format="png", dpi=150, pil_kwargs={"compress_level": 1})
+
+        return buf.getvalue()
 
     # =========================================================
-    def export_pdf(self, filename="report.pdf", chart_path="chart.png"):
-        pdf = SimpleDocTemplate(
-            filename,
-            pagesize=letter,
-            leftMargin=40,
-            rightMargin=40,
-            topMargin=40,
-            bottomMargin=40
-        )
-
-        styles = getSampleStyleSheet()
-        Story = []
+    def export_pdf(self, filename="report.pdf", chart_buf=None):
+        """chart_buf: PNG buffer (or path) from plot_candles; rendered here when None."""
+        if chart_buf is None:
+            chart_buf = self.plot_candles()
+
+        from reportlab.pdfgen import canvas
+        from reportlab.platypus import Paragraph
+        from reportlab.lib.pagesizes import letter
+        from reportlab.lib.units import inch
+        from reportlab.lib.utils import ImageReader
+
+        title_style, body_style = _pdf_styles()
+
+        # Fixed layout drawn straight on a canvas (no Platypus flow/pagination)
+        pdf = canvas.Canvas(filename, pagesize=letter)
+        page_w, page_h = letter
+        margin = 40
+        frame_w = page_w - 2 * margin
+        y = page_h - margin
+
+        def ensure_room(height):
+            # Start a new page when the next block does not fit
+            nonlocal y
+            if y - height < margin and y < page_h - margin:
+                pdf.showPage()
+                y = page_h - margin
+
+        def draw_paragraph(text):
+            nonlocal y
+            para = Paragraph(text, body_style)
+            _, height = para.wrapOn(pdf, frame_w, page_h - 2 * margin)
+            ensure_room(height)
+            para.drawOn(pdf, margin, y - height)
+            y -= height + 20
 
         # Title
-        title_style = styles["Title"]
-        title_style.alignment = TA_CENTER
-        Story.append(Paragraph("Stock Technical Analysis Report", title_style))
-        Story.append(Spacer(1, 20))
+        pdf.setFont(title_style.fontName, title_style.fontSize)
+        y -= title_style.leading
+        pdf.drawCentredString(page_w / 2, y, "Stock Technical Analysis Report")
+        y -= title_style.spaceAfter + 20
 
         # Summary
-        summary = self.generate_text_summary()
-        Story.append(Paragraph(summary, styles["BodyText"]))
-        Story.append(Spacer(1, 20))
+        draw_paragraph(self.generate_text_summary())
 
         # Detailed Analysis
-        detailed = self.generate_detailed_analysis()
-        Story.append(Paragraph(detailed, styles["BodyText"]))
-        Story.append(Spacer(1, 20))
+        draw_paragraph(self.generate_detailed_analysis())
 
         # Chart
+        img_w, img_h = 6 * inch, 3 * inch
         try:
-            img = Image(chart_path, width=6*inch, height=3*inch)
-            Story.append(img)
-        except:
-            Story.append(Paragraph("Chart failed to load.", styles["BodyText"]))
+            ensure_room(img_h)
+            pdf.drawImage(ImageReader(chart_buf), (page_w - img_w) / 2, y - img_h, img_w, img_h)
+        except Exception:
+            draw_paragraph("Chart failed to load.")
 
-        pdf.build(Story)
+        pdf.showPage()
+        pdf.save()
         return filename
@@ -1,11 +1,16 @@
+import glob
+import hashlib
+import os
+import shlex
+from concurrent.futures import ProcessPoolExecutor
+
+from analyzer._nb import HAVE_NUMBA
 from analyzer.data_loader import DataLoader
-from analyzer.features import build_features
-from analyzer.patterns import PatternDetector
-from analyzer.model import Model
+from analyzer.pipeline import run_pipeline
 from analyzer.report import Report
 
 
-def run_analysis(file_path):
+def run_analysis(file_path, pdf_path="report.pdf"):
     print("\n=== Starting Stock Analysis ===\n")
 
     # 1. LOAD DATA
@@ -13,40 +18,98 @@ def run_analysis(file_path):
     loader = DataLoader(file_path)
     df = loader.load_csv()                     # ✔ Load DataFrame
 
-    # 2. BUILD FEATURES
-    print("2. Computing features...")
-    df = build_features(df)                    # ✔ Adds RSI, ATR, MACD, trend, etc.
-
-    # 3. DETECT PATTERNS
-    print("3. Detecting patterns...")
-    df = PatternDetector(df).detect_all()      # ✔ Correct method name
-
-    # 4. RUN MODEL
-    print("4. Running model...")
-    model = Model(df)                          # ✔ Model requires df
-    model_output = model.summary()             # ✔ Uses hybrid_probability()
+    # 2-4. FEATURES + PATTERNS + MODEL
+    print("2. Computing features, patterns & model...")
+    df, model_output = run_pipeline(df, file_path)  # ✔ Features, patterns, model (features cached per CSV)
 
     prob = model_output["probability_next_bullish"]
 
-    # 5. GENERATE CHART + REPORT
-    print("5. Generating chart & PDF report...")
+    # 3. GENERATE CHART + REPORT
+    print("3. Generating chart & PDF report...")
     report = Report(df, model_output)
-    chart_path = report.plot_candles("chart.png")
-    pdf_path = report.export_pdf("report.pdf", chart_path)
+    chart_buf = report.plot_candles()           # ✔ PNG kept in memory
+    pdf_path = report.export_pdf(pdf_path, chart_buf)
 
     print("\n === ANALYSIS COMPLETE ===")
-    print(f"Chart saved as: {chart_path}")
     print(f"Report saved as: {pdf_path}")
     print(f"Next Bullish Candle Probability: {prob}%")
     print("============================\n")
 
+    return pdf_path
+
+
+def _init_worker():
+    # One process per core already; keep numba's parallel pattern scan to a
+    # single thread per worker so the cores are not oversubscribed
+    if HAVE_NUMBA:
+        import numba
+        numba.set_num_threads(1)
+
+
+def run_many(paths):
+    """
+    Runs run_analysis for several CSVs in parallel, one PDF per file.
+    PDFs are named <name>_report.pdf; files sharing a name in different
+    folders get a short hash of their full path added so they never collide.
+    """
+    paths = list(dict.fromkeys(os.path.abspath(p) for p in paths))
+    stems = [os.path.splitext(os.path.basename(p))[0] for p in paths]
+    pdf_paths = []
+    for p, stem in zip(paths, stems):
+        if stems.count(stem) > 1:
+            stem += "-" + hashlib.blake2b(p.encode(), digest_size=4).hexdigest()
+        pdf_paths.append(f"{stem}_report.pdf")
+
+    with ProcessPoolExecutor(initializer=_init_worker) as ex:
+        return list(ex.map(run_analysis, paths, pdf_paths))
+
+
+def _csv_path(name):
+    # Bare ticker names live in data/ (as in the original single-file prompt)
+    if not name.lower().endswith(".csv"):
+        return f"data/{name}.csv"
+    return name
+
+
+def resolve_paths(text):
+    """
+    Turns the CLI input into CSV paths.
+    The whole input is one path when that file exists (spaces allowed);
+    otherwise it is split shell-style (quote paths with spaces) and globs
+    and bare ticker names are expanded.
+    """
+    text = text.strip()
+    if not text:
+        raise ValueError("no CSV file given")
+
+    if os.path.exists(text) or os.path.exists(_csv_path(text)):
+        return [text if os.path.exists(text) else _csv_path(text)]
+
+    paths = []
+    # POSIX shlex treats backslashes as escapes, which mangles Windows paths;
+    # non-POSIX mode keeps them but leaves the quotes on quoted tokens
+    posix = os.name != "nt"
+    for name in shlex.split(text, posix=posix):
+        if not posix and len(name) > 1 and name[0] == name[-1] and name[0] in "\"'":
+            name = name[1:-1]
+        if any(ch in name for ch in "*?["):
+            matches = sorted(glob.glob(name))
+            if not matches:
+                raise ValueError(f"no CSV file matches {name!r}")
+            paths.extend(matches)
+        else:
+            paths.append(_csv_path(name))
+    return paths
+
 
 if __name__ == "__main__":
     print("=== STOCK ANALYSIS TOOL ===")
-    file_path = input("Enter the path or name of the CSV file: ").strip()
-
-    if not file_path.lower().endswith(".csv"):
-        file_path = f"data/{file_path}.csv"
+    try:
+        paths = resolve_paths(input("Enter the path(s), name(s) or glob of the CSV file(s): "))
+    except ValueError as e:
+        raise SystemExit(f"Error: {e}")
 
-    run_analysis(file_path)
-    
\ No newline at end of file
+    if len(paths) == 1:
+        run_analysis(paths[0])
+    else:
+        run_many(paths)